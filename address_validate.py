@@ -1,11 +1,26 @@
 import streamlit as st
 import pandas as pd
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import os
+import hashlib
+import re
+import sqlite3
 import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
+import xlsxwriter
 import base64
 
+try:
+    import redis
+except ImportError:
+    redis = None
+
 # Page configuration
 st.set_page_config(
     page_title="Click2mail Address Validation Tool",
@@ -13,45 +28,316 @@ st.set_page_config(
     layout="wide"
 )
 
-def geocode_address(address_text, api_key):
-    url = f"https://maps.googleapis.com/maps/api/geocode/json"
+# Concurrency / rate limiting
+MAX_WORKERS = 32
+# Shared across all workers; the Geocoding API default quota is 3,000 requests/minute
+MAX_REQUESTS_PER_SECOND = 50
+
+class _TokenBucket:
+    """
+    Thread-safe token bucket: refills at `rate` tokens per second, up to `capacity`
+    """
+
+    def __init__(self, rate, capacity):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self._rate
+            time.sleep(delay)
+
+@st.cache_resource
+def get_rate_limiter():
+    """
+    Rate limiter shared by every session, since the API quota is per project
+    """
+    return _TokenBucket(MAX_REQUESTS_PER_SECOND, capacity=MAX_REQUESTS_PER_SECOND)
+
+_rate_limiter = get_rate_limiter()
+
+@st.cache_resource
+def get_session():
+    """
+    HTTP session that keeps connections to Google alive between calls; held as a
+    Streamlit resource so the warm pool survives reruns and is shared by sessions
+    """
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        # validateAddress is a read-only lookup, so retrying the POST is safe
+        allowed_methods=frozenset({"GET", "POST"})
+    )
+    # Block rather than open an extra connection that the full pool would
+    # throw away after one request, wasting its TCP + TLS handshake
+    adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS, max_retries=retries, pool_block=True)
+    session.mount("https://", adapter)
+    return session
+
+_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+_VALIDATE_URL = "https://addressvalidation.googleapis.com/v1:validateAddress"
+_JSON_HEADERS = {"Content-Type": "application/json"}
+# Seconds to wait for a connection or response before giving up on a call
+REQUEST_TIMEOUT = 10
+
+# Response caching
+RESPONSE_CACHE_SIZE = 50_000
+_PUNCTUATION_RE = re.compile(r"[^\w\s#/-]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def _normalize_address(address):
+    """
+    Cache key for an address: uppercased, punctuation stripped, whitespace collapsed
+    """
+    key = _PUNCTUATION_RE.sub(" ", address.upper())
+    return _WHITESPACE_RE.sub(" ", key).strip()
+
+def _hash_api_key(api_key):
+    """
+    Part of every cache key, so one API key's results are never served to another
+    (a revoked or exhausted key would otherwise look like it still works)
+    """
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+class _ResponseCache:
+    """
+    Thread-safe LRU cache of validation responses, with the time each was fetched
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, fetched_after):
+        """
+        Return the cached response, or None if missing or fetched before `fetched_after`
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            fetched_at, value = entry
+            if fetched_at < fetched_after:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, fetched_at):
+        with self._lock:
+            self._entries[key] = (fetched_at, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+@st.cache_resource
+def get_response_cache():
+    """
+    Response cache shared by every rerun and session of this app process
+    """
+    return _ResponseCache(RESPONSE_CACHE_SIZE)
+
+# On-disk result store, so re-runs and interrupted batches don't pay for
+# addresses that were already validated
+RESULTS_DB_PATH = ".addr_results.db"
+RESULTS_TTL_SECONDS = 30 * 24 * 60 * 60
+# Expired rows are kept a while longer as a fallback for API outages
+RESULTS_RETENTION_SECONDS = 2 * RESULTS_TTL_SECONDS
+_RESULTS_BATCH_SIZE = 500
+
+def _open_results_db():
+    conn = sqlite3.connect(RESULTS_DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # Rows written before results were keyed by API key can't be attributed to one
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+    if columns and "api_key_hash" not in columns:
+        conn.execute("DROP TABLE results")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS results ("
+        "norm_key TEXT NOT NULL, enable_cass INTEGER NOT NULL, api_key_hash TEXT NOT NULL, "
+        "json BLOB NOT NULL, ts INTEGER NOT NULL, "
+        "PRIMARY KEY (norm_key, enable_cass, api_key_hash))"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS results_ts ON results (ts)")
+    # Drop rows past the fallback window so the file doesn't grow without bound
+    with conn:
+        conn.execute("DELETE FROM results WHERE ts < ?", [int(time.time()) - RESULTS_RETENTION_SECONDS])
+    return conn
+
+def _load_stored_results(conn, keys):
+    """
+    Fetch stored responses for cache keys, split into fresh ones, as
+    (response, fetched_at), and expired ones that are only kept as an outage
+    fallback
+    """
+    cutoff = int(time.time()) - RESULTS_TTL_SECONDS
+    fresh = {}
+    stale = {}
+    for enable_cass, api_key_hash in {(cass, key_hash) for _, cass, key_hash in keys}:
+        norm_keys = [norm_key for norm_key, cass, key_hash in keys if (cass, key_hash) == (enable_cass, api_key_hash)]
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(norm_keys), _RESULTS_BATCH_SIZE):
+            chunk = norm_keys[start:start + _RESULTS_BATCH_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                "SELECT norm_key, json, ts FROM results "
+                f"WHERE enable_cass = ? AND api_key_hash = ? AND norm_key IN ({placeholders})",
+                [int(enable_cass), api_key_hash, *chunk]
+            )
+            for norm_key, blob, ts in rows:
+                key = (norm_key, enable_cass, api_key_hash)
+                if ts >= cutoff:
+                    fresh[key] = (orjson.loads(blob), ts)
+                else:
+                    stale[key] = orjson.loads(blob)
+    return fresh, stale
+
+def _store_results(conn, items):
+    """
+    Insert or refresh (key, response) pairs in a single transaction
+    """
+    now = int(time.time())
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO results (norm_key, enable_cass, api_key_hash, json, ts) VALUES (?, ?, ?, ?, ?)",
+            [
+                (norm_key, int(enable_cass), api_key_hash, orjson.dumps(response), now)
+                for (norm_key, enable_cass, api_key_hash), response in items
+            ]
+        )
+
+# Optional Redis cache shared by every app instance. Entries are kept for the
+# same retention window as the SQLite store so expired ones can still stand in
+# for the API during an outage; the server should run with
+# `maxmemory-policy allkeys-lfu`.
+REDIS_URL = os.environ.get("REDIS_URL")
+# Seconds to wait on Redis before treating a lookup or write as a miss
+REDIS_TIMEOUT = 1
+
+@st.cache_resource
+def get_redis():
+    """
+    Shared Redis client, or None when REDIS_URL isn't set or redis isn't installed
+    """
+    if not REDIS_URL or redis is None:
+        return None
+    pool = redis.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=MAX_WORKERS,
+        socket_connect_timeout=REDIS_TIMEOUT,
+        socket_timeout=REDIS_TIMEOUT
+    )
+    return redis.Redis(connection_pool=pool)
+
+def _redis_key(key):
+    norm_key, enable_cass, api_key_hash = key
+    return "gav:" + hashlib.sha256(f"{norm_key}|{api_key_hash}|{int(enable_cass)}".encode()).hexdigest()
+
+def _load_shared_results(client, keys):
+    """
+    Fetch responses from Redis as (fresh, stale) dicts like _load_stored_results;
+    Redis problems count as misses
+    """
+    fresh = {}
+    stale = {}
+    if client is None:
+        return fresh, stale
+    cutoff = int(time.time()) - RESULTS_TTL_SECONDS
+    try:
+        for start in range(0, len(keys), _RESULTS_BATCH_SIZE):
+            chunk = keys[start:start + _RESULTS_BATCH_SIZE]
+            for key, blob in zip(chunk, client.mget([_redis_key(key) for key in chunk])):
+                if blob is None:
+                    continue
+                # Skip anything under our prefix that we didn't write
+                try:
+                    entry = orjson.loads(blob)
+                    if entry["ts"] >= cutoff:
+                        fresh[key] = (entry["response"], entry["ts"])
+                    else:
+                        stale[key] = entry["response"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+    except redis.RedisError:
+        pass
+    return fresh, stale
+
+def _store_shared_results(client, items):
+    if client is None:
+        return
+    now = int(time.time())
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for key, response in items:
+            pipeline.set(_redis_key(key), orjson.dumps({"ts": now, "response": response}), ex=RESULTS_RETENTION_SECONDS)
+        pipeline.execute()
+    except redis.RedisError:
+        pass
+
+def geocode_address(address_text, api_key, session=None):
+    session = session or get_session()
     params = {
         "address": address_text,
         "key": api_key
     }
-    response = requests.get(url, params=params)
+    _rate_limiter.wait()
+    response = session.get(_GEOCODE_URL, params=params, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
-    data = response.json()
+    data = orjson.loads(response.content)
     if not data['results']:
         raise ValueError("No results found for address")
     # Grab the first result
     result = data['results'][0]
     return result
 
+# Geocode component types that name the place itself, and the Address
+# Validation fields filled from the remaining types: type -> (field, name key)
+_POI_TYPES = frozenset({"point_of_interest", "establishment", "university"})
+_COMPONENT_FIELDS = {
+    "locality": ("locality", "long_name"),
+    "administrative_area_level_1": ("administrativeArea", "short_name"),
+    "country": ("regionCode", "short_name"),
+    "postal_code": ("postalCode", "long_name"),
+}
+
 def build_validation_request(geocode_result, original_input):
     address_components = geocode_result.get('address_components', [])
     formatted_address = geocode_result.get('formatted_address', "")
 
     components = {}
-    poi_names = []
+    poi_names = {}  # insertion-ordered set
     for comp in address_components:
         types = comp['types']
-        if any(t in types for t in ["point_of_interest", "establishment", "university"]):
-            if comp['long_name'] not in poi_names:
-                poi_names.append(comp['long_name'])
-        elif "locality" in types:
-            components["locality"] = comp['long_name']
-        elif "administrative_area_level_1" in types:
-            components["administrativeArea"] = comp['short_name']
-        elif "country" in types:
-            components["regionCode"] = comp['short_name']
-        elif "postal_code" in types:
-            components["postalCode"] = comp['long_name']
+        if not _POI_TYPES.isdisjoint(types):
+            poi_names[comp['long_name']] = None
+        else:
+            for t in types:
+                field = _COMPONENT_FIELDS.get(t)
+                if field:
+                    components[field[0]] = comp[field[1]]
+                    break
+            # Components run from most to least specific, so once the
+            # country/postal-level fields are filled no POI names follow
+            if len(components) == len(_COMPONENT_FIELDS):
+                break
 
     # Build smart address lines
-    address_lines = []
-    for name in poi_names:
-        address_lines.append(name)
+    address_lines = list(poi_names)
 
     # Always keep the original input to ensure important names like "Harvard"
     if original_input not in address_lines:
@@ -68,50 +354,93 @@ def build_validation_request(geocode_result, original_input):
         "address": components
     }
 
-def validate_address_google(address, api_key, enable_cass=True, region_code="US"):
-    """
-    Click2mail Address Validation Tool
-    """
-
-    geocode_result = geocode_address(address, api_key)
-    validation_request = build_validation_request(geocode_result, address)
+def _post_validation(validation_request, api_key, session):
+    _rate_limiter.wait()
+    response = session.post(_VALIDATE_URL, headers=_JSON_HEADERS, data=orjson.dumps(validation_request), params={"key": api_key}, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return orjson.loads(response.content)
 
+# Verdicts from the raw input that are good enough to skip the geocode step
+_DIRECT_GRANULARITIES = frozenset({"SUB_PREMISE", "PREMISE"})
 
-    url = "https://addressvalidation.googleapis.com/v1:validateAddress"
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
+def validate_direct(address, api_key, enable_cass=True, session=None):
+    """
+    Validate the address text as entered, without geocoding it first
+    """
+    session = session or get_session()
     payload = {
         "address": {
             "addressLines": [address]
         },
         "enableUspsCass": enable_cass
     }
-    
-    params = {
-        "key": api_key
-    }
-    
+    return _post_validation(payload, api_key, session)
+
+def validate_address_google(address, api_key, enable_cass=True, region_code="US", session=None):
+    """
+    Click2mail Address Validation Tool
+    """
+    session = session or get_session()
+
+    # Cleanly formatted input validates fine on its own; only pay for the
+    # geocode-enriched request (needed for inputs like "Harvard") when the
+    # direct verdict is weak
+    direct_result = None
+    try:
+        direct_result = validate_direct(address, api_key, enable_cass, session=session)
+        verdict = direct_result.get("result", {}).get("verdict", {})
+        if verdict.get("validationGranularity") in _DIRECT_GRANULARITIES and verdict.get("addressComplete"):
+            return direct_result
+    except (requests.exceptions.RequestException, ValueError):
+        pass
+
     try:
-        response = requests.post(url, headers=headers, json=validation_request, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        geocode_result = geocode_address(address, api_key, session=session)
+        validation_request = build_validation_request(geocode_result, address)
+        validation_request["enableUspsCass"] = enable_cass
+        enriched_result = _post_validation(validation_request, api_key, session)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        # A weak direct verdict is still a real answer
+        if direct_result is not None:
+            return direct_result
         return {"error": str(e)}
 
+    # Keep whichever verdict is more precise, preferring the enriched one on a tie
+    if direct_result is not None and _granularity_rank(direct_result) < _granularity_rank(enriched_result):
+        return direct_result
+    return enriched_result
+
+_DPV_CONFIRMATION_DESCRIPTIONS = {
+    'Y': 'Address confirmed (Primary and secondary if present).',
+    'N': 'Address not confirmed (No primary or secondary match).',
+    'D': 'Primary confirmed, but secondary information is missing.',
+    'S': 'Primary confirmed, secondary information exists but was not provided in the input.',
+    'C': 'Address confirmed, but it is a Commercial Mail Receiving Agency (CMRA).',
+    'B': 'Primary confirmed, but it is a PO Box or equivalent.'
+}
+
+# Validation granularity -> (status, is_valid)
+_GRANULARITY_STATUS = {
+    "SUB_PREMISE": ("Highly Mailable Address (Validated to sub-unit)", True),
+    "PREMISE": ("Standard Mailable Address (Validated to building)", True),
+    "STREET": ("Partial Address (Street-level only, may not be reliably mailable)", True),
+    "LOCALITY": ("Non-Mailable Address (Only city-level validated)", False),
+    "REGION": ("Non-Mailable Address (Only region/state validated)", False),
+    "COUNTRY": ("Non-Mailable Address (Only country validated)", False),
+    "OTHER": ("Non-Mailable Address (Unknown or unvalidated)", False)
+}
+_UNKNOWN_GRANULARITY_STATUS = ("Non-Mailable Address (Unknown validation granularity)", False)
+# Granularities from most to least precise; unknown ones rank last
+_GRANULARITY_RANKS = {granularity: rank for rank, granularity in enumerate(_GRANULARITY_STATUS)}
+
+def _granularity_rank(result):
+    """Lower is more precise"""
+    granularity = result.get("result", {}).get("verdict", {}).get("validationGranularity")
+    return _GRANULARITY_RANKS.get(granularity, len(_GRANULARITY_RANKS))
+
 def _map_dpv_confirmation(code):
     """Maps DPV confirmation codes to human-readable descriptions."""
-    mapping = {
-        'Y': 'Address confirmed (Primary and secondary if present).',
-        'N': 'Address not confirmed (No primary or secondary match).',
-        'D': 'Primary confirmed, but secondary information is missing.',
-        'S': 'Primary confirmed, secondary information exists but was not provided in the input.',
-        'C': 'Address confirmed, but it is a Commercial Mail Receiving Agency (CMRA).',
-        'B': 'Primary confirmed, but it is a PO Box or equivalent.'
-    }
-    return mapping.get(code, "Unknown DPV Confirmation Code")
+    return _DPV_CONFIRMATION_DESCRIPTIONS.get(code, "Unknown DPV Confirmation Code")
 
 def parse_validation_result(result, original_address, region_code="US", enable_usps_cass=True):
     """
@@ -138,30 +467,7 @@ def parse_validation_result(result, original_address, region_code="US", enable_u
         address_complete = verdict.get("addressComplete", False)
         has_inferred = verdict.get("hasInferredComponents", False)
 
-        if validation_granularity == "SUB_PREMISE":
-            status = "Highly Mailable Address (Validated to sub-unit)"
-            is_valid = True
-        elif validation_granularity == "PREMISE":
-            status = "Standard Mailable Address (Validated to building)"
-            is_valid = True
-        elif validation_granularity == "STREET":
-            status = "Partial Address (Street-level only, may not be reliably mailable)"
-            is_valid = True
-        elif validation_granularity == "LOCALITY":
-            status = "Non-Mailable Address (Only city-level validated)"
-            is_valid = False
-        elif validation_granularity == "REGION":
-            status = "Non-Mailable Address (Only region/state validated)"
-            is_valid = False
-        elif validation_granularity == "COUNTRY":
-            status = "Non-Mailable Address (Only country validated)"
-            is_valid = False
-        elif validation_granularity == "OTHER":
-            status = "Non-Mailable Address (Unknown or unvalidated)"
-            is_valid = False
-        else:
-            status = "Non-Mailable Address (Unknown validation granularity)"
-            is_valid = False
+        status, is_valid = _GRANULARITY_STATUS.get(validation_granularity, _UNKNOWN_GRANULARITY_STATUS)
 
         # Add inferred note if relevant
         if has_inferred and validation_granularity in {"SUB_PREMISE", "PREMISE", "STREET"}:
@@ -229,11 +535,23 @@ def parse_validation_result(result, original_address, region_code="US", enable_u
             "usps_data": None
         }
 
+# Explicit dtypes for parsed result columns, instead of leaving them as object
+# columns; flags are nullable since error results don't carry them
+_RESULT_DTYPES = {
+    "original_address": "string",
+    "validated_address": "string",
+    "validation_status": "string",
+    "dpv_confirmation_description": "string",
+    "is_valid": "bool",
+    "is_po_box": "boolean",
+    "is_dpv_confirmed": "boolean",
+    "is_confirmed": "boolean"
+}
+
 def process_addresses(df, address_column, api_key, enable_cass=False):
     """
     Process addresses from dataframe
     """
-    results = []
     progress_bar = st.progress(0)
     status_text = st.empty()
     invalid_addresses_container = st.container()
@@ -245,57 +563,224 @@ def process_addresses(df, address_column, api_key, enable_cass=False):
         invalid_placeholder = st.empty()
         invalid_count = 0
     
-    for idx, row in df.iterrows():
-        address = str(row[address_column])
+    # str() per value rather than astype(str): pandas 3 keeps missing values as NaN
+    addresses = [str(address) for address in df[address_column]]
+    # One parsed result per distinct address, plus each row's position in that list
+    unique_results = []
+    result_positions = [None] * total_addresses
+    result_columns = {}  # insertion-ordered set of parsed field names
+    response_cache = get_response_cache()
+    # Resolved here: cached resources should be looked up on the script thread
+    session = get_session()
+    
+    # Validate each distinct address once and fan the result out to its rows
+    api_key_hash = _hash_api_key(api_key)
+    rows_by_key = {}
+    for idx, address in enumerate(addresses):
+        rows_by_key.setdefault((_normalize_address(address), enable_cass, api_key_hash), []).append(idx)
+    total_unique = len(rows_by_key)
+    
+    # Each UI update is a round-trip to the browser, so only refresh every
+    # `update_every` addresses (about 200 refreshes per batch)
+    update_every = max(1, total_unique // 200)
+    invalid_rows = []
+    
+    # Validate addresses concurrently; results are rendered here on the script
+    # thread as they complete since Streamlit calls can't be made from workers
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    results_db = _open_results_db()
+    redis_client = get_redis()
+    pending_writes = []
+    
+    def flush_writes():
+        _store_results(results_db, pending_writes)
+        _store_shared_results(redis_client, pending_writes)
+        pending_writes.clear()
+    
+    try:
+        # (key, response, fetched_at, source) for every address a cache layer answered
+        cached_results = []
+        missing_keys = []
+        fresh_after = int(time.time()) - RESULTS_TTL_SECONDS
+        for key in rows_by_key:
+            cached = response_cache.get(key, fresh_after)
+            if cached is not None:
+                cached_results.append((key, cached, None, "memory"))
+            else:
+                missing_keys.append(key)
         
-        # Update progress
-        progress = (idx + 1) / total_addresses
-        progress_bar.progress(progress)
-        status_text.text(f"Processing address {idx + 1} of {total_addresses}: {address[:50]}...")
+        stored_results, stale_results = _load_stored_results(results_db, missing_keys)
+        cached_results.extend((key, response, ts, "store") for key, (response, ts) in stored_results.items())
+        missing_keys = [key for key in missing_keys if key not in stored_results]
         
-        # Validate address
-        validation_result = validate_address_google(address, api_key, enable_cass)
-        parsed_result = parse_validation_result(validation_result, address)
+        shared_results, shared_stale_results = _load_shared_results(redis_client, missing_keys)
+        cached_results.extend((key, response, ts, "store") for key, (response, ts) in shared_results.items())
+        stale_results.update(shared_stale_results)
         
-        # Add original row data
-        result_row = row.to_dict()
-        result_row.update(parsed_result)
-        results.append(result_row)
+        futures = {}
+        for key in missing_keys:
+            if key not in shared_results:
+                address = addresses[rows_by_key[key][0]]
+                futures[executor.submit(validate_address_google, address, api_key, enable_cass, session=session)] = key
         
-        # Stream invalid addresses
-        if not parsed_result["is_valid"]:
-            invalid_count += 1
-            with st.container():
-                st.error(f"**Address {idx + 1}:** {address}")
-                st.write(f"**Status:** {parsed_result['validation_status']}")
-                st.write(f"**Suggested:** {parsed_result['validated_address']}")
-                st.write("---")
+        def completed():
+            yield from cached_results
+            for future in as_completed(futures):
+                yield futures[future], future.result(), int(time.time()), "api"
         
-        # Rate limiting - Google allows 100 requests per minute
-        time.sleep(0.6)  # Sleep for 600ms between requests
+        for done, (key, validation_result, fetched_at, source) in enumerate(completed(), start=1):
+            row_indices = rows_by_key[key]
+            address = addresses[row_indices[0]]
+            
+            # Only cache successful responses so failures are retried next time
+            is_stale = False
+            if "error" not in validation_result:
+                # Keep the original fetch time so entries still expire on schedule
+                if source != "memory":
+                    response_cache.put(key, validation_result, fetched_at)
+                if source == "api":
+                    pending_writes.append((key, validation_result))
+                    if len(pending_writes) >= _RESULTS_BATCH_SIZE:
+                        flush_writes()
+            elif key in stale_results:
+                # Rather an outdated answer than none while the API is failing
+                validation_result = stale_results[key]
+                is_stale = True
+            parsed_result = parse_validation_result(validation_result, address)
+            if is_stale:
+                parsed_result["validation_status"] += " — Note: API unavailable, using an expired cached result."
+            
+            for idx in row_indices:
+                result_positions[idx] = len(unique_results)
+            unique_results.append(parsed_result)
+            result_columns.update(dict.fromkeys(parsed_result))
+            
+            if not parsed_result["is_valid"]:
+                invalid_count += len(row_indices)
+                invalid_rows.append({
+                    "Row": row_indices[0] + 1,
+                    "Address": address,
+                    "Status": parsed_result['validation_status'],
+                    "Suggested": parsed_result['validated_address'],
+                    "Duplicate Rows": len(row_indices) - 1
+                })
+            
+            # Update progress and stream invalid addresses
+            if done % update_every == 0 or done == total_unique:
+                progress_bar.progress(done / total_unique)
+                status_text.text(f"Processing unique address {done} of {total_unique}: {address[:50]}...")
+                if invalid_rows:
+                    invalid_placeholder.dataframe(pd.DataFrame(invalid_rows), hide_index=True)
+    finally:
+        # Don't keep spending quota on queued addresses if the run is stopped,
+        # but keep whatever was already paid for
+        executor.shutdown(wait=False, cancel_futures=True)
+        if pending_writes:
+            flush_writes()
+        results_db.close()
+    
+    # Per run, counting hits from whichever cache layer answered
+    with st.sidebar:
+        st.metric("Cache Hits", len(cached_results))
+        st.metric("Sent to API", len(futures))
     
     status_text.text(f"✅ Processing complete! Found {invalid_count} invalid addresses out of {total_addresses}")
-    return pd.DataFrame(results)
+    
+    # Build the parsed fields column by column over the distinct results, then
+    # expand to one row per input row
+    parsed_df = pd.DataFrame({
+        name: [result.get(name) for result in unique_results] for name in result_columns
+    }).take(result_positions).reset_index(drop=True)
+    # Duplicate rows share one parsed result; keep each row's own spelling
+    parsed_df["original_address"] = addresses
+    parsed_df = parsed_df.astype({name: dtype for name, dtype in _RESULT_DTYPES.items() if name in parsed_df.columns})
+    
+    # Join the parsed fields onto the original rows in one go; they replace any
+    # same-named columns from the upload
+    source_df = df.drop(columns=parsed_df.columns, errors="ignore").reset_index(drop=True)
+    return pd.concat([source_df, parsed_df], axis=1)
+
+_INF = float('inf')
 
-def download_dataframe(df, filename):
+def _build_xlsx_bytes(df, sheet_name='Validated_Addresses'):
     """
-    Create download link for dataframe
+    Serialize dataframe to XLSX, streaming rows with xlsxwriter's constant memory mode
     """
-    # Convert to Excel
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Validated_Addresses')
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+        'remove_timezone': True,
+        'nan_inf_to_errors': True
+    })
+    worksheet = workbook.add_worksheet(sheet_name)
     
-    output.seek(0)
+    # Constant memory mode only holds the current row, so cells must be written
+    # row by row (pandas' to_excel writes column by column and would lose data)
+    worksheet.write_row(0, 0, [str(column) for column in df.columns])
+    # Blank out missing values and spell out infinities, as to_excel's inf_rep does
+    values = df.astype(object).where(df.notna(), None).replace({_INF: 'inf', -_INF: '-inf'})
+    for row_num, row in enumerate(values.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_num, 0, row)
+    
+    workbook.close()
+    return output.getvalue()
+
+@st.cache_resource
+def get_export_executor():
+    """
+    Background workers for building XLSX downloads off the script thread
+    """
+    return ThreadPoolExecutor(max_workers=2)
+
+def build_xlsx_in_background(df):
+    """
+    Start serializing dataframe to XLSX; returns a future for the workbook bytes
+    """
+    return get_export_executor().submit(_build_xlsx_bytes, df)
+
+def download_dataframe(df, filename, xlsx_future=None):
+    """
+    Create download links for dataframe
+    """
+    if xlsx_future is None:
+        xlsx_future = build_xlsx_in_background(df)
+    
+    # CSV is much cheaper to produce when Excel formatting isn't needed, and is
+    # offered first so it stays available even if the workbook fails
+    csv_filename = filename.rsplit('.', 1)[0] + '.csv'
+    st.download_button(
+        label=f"📥 Download {csv_filename}",
+        data=df.to_csv(index=False).encode('utf-8'),
+        file_name=csv_filename,
+        mime="text/csv"
+    )
+    
+    try:
+        if not xlsx_future.done():
+            with st.spinner(f"Preparing {filename}..."):
+                xlsx_future.result()
+        xlsx_bytes = xlsx_future.result()
+    except Exception as e:
+        st.error(f"❌ Could not build {filename}: {str(e)}")
+        return
     
-    # Create download button
     st.download_button(
         label=f"📥 Download {filename}",
-        data=output,
+        data=xlsx_bytes,
         file_name=filename,
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
+@st.cache_data(show_spinner=False, max_entries=4, ttl=24 * 60 * 60)
+def _load_df(file_bytes, name):
+    """
+    Parse an uploaded CSV or Excel file; cached on the raw bytes so reruns don't re-parse it
+    """
+    if name.endswith('.csv'):
+        return pd.read_csv(BytesIO(file_bytes))
+    return pd.read_excel(BytesIO(file_bytes))
+
 def main():
     st.title("🏠 Click2mail Address Validation Tool")
     st.markdown("Upload a CSV or Excel file with addresses and validate them using Click2mail's Address Validation API")
@@ -328,10 +813,7 @@ def main():
     if uploaded_file is not None and api_key:
         try:
             # Read the file
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            else:
-                df = pd.read_excel(uploaded_file)
+            df = _load_df(uploaded_file.getvalue(), uploaded_file.name)
             
             st.success(f"✅ File uploaded successfully! Found {len(df)} rows")
             
@@ -360,9 +842,19 @@ def main():
                 # Display results
                 st.header("📊 Validation Results")
                 
+                valid_mask = validated_df['is_valid'].to_numpy(dtype=bool)
+                corrected_df = validated_df.loc[valid_mask]
+                invalid_df = validated_df.loc[~valid_mask]
+                
+                # Start building the workbooks now so they're ready by the time
+                # the results below have been rendered
+                all_xlsx = build_xlsx_in_background(validated_df)
+                corrected_xlsx = build_xlsx_in_background(corrected_df) if len(corrected_df) > 0 else None
+                invalid_xlsx = build_xlsx_in_background(invalid_df) if len(invalid_df) > 0 else None
+                
                 # Summary statistics
                 total_addresses = len(validated_df)
-                valid_addresses = len(validated_df[validated_df['is_valid'] == True])
+                valid_addresses = int(valid_mask.sum())
                 invalid_addresses = total_addresses - valid_addresses
                 
                 col1, col2, col3 = st.columns(3)
@@ -384,25 +876,23 @@ def main():
                 
                 with col1:
                     st.subheader("All Addresses")
-                    download_dataframe(validated_df, "all_validated_addresses.xlsx")
+                    download_dataframe(validated_df, "all_validated_addresses.xlsx", all_xlsx)
                 
                 with col2:
                     st.subheader("Corrected Addresses Only")
-                    corrected_df = validated_df[validated_df['is_valid'] == True]
                     if len(corrected_df) > 0:
-                        download_dataframe(corrected_df, "corrected_addresses_only.xlsx")
+                        download_dataframe(corrected_df, "corrected_addresses_only.xlsx", corrected_xlsx)
                     else:
                         st.info("No valid addresses found")
                 
                 # Invalid addresses summary
-                invalid_df = validated_df[validated_df['is_valid'] == False]
                 if len(invalid_df) > 0:
                     st.header("❌ Invalid Addresses Summary")
                     st.dataframe(invalid_df[['original_address', 'validated_address', 'validation_status']])
                     
                     with col2:
                         st.subheader("Invalid Addresses Only")
-                        download_dataframe(invalid_df, "invalid_addresses.xlsx")
+                        download_dataframe(invalid_df, "invalid_addresses.xlsx", invalid_xlsx)
         
         except Exception as e:
             st.error(f"❌ Error processing file: {str(e)}")
@@ -438,6 +928,10 @@ def main():
            - Download only corrected/valid addresses
            - Download only invalid addresses for review
         
+        ### Caching:
+        - Validated addresses are cached in memory and in a local `.addr_results.db` file for 30 days, per API key
+        - To share the cache between app instances, install the optional `redis` package and set the `REDIS_URL` environment variable (e.g. `redis://localhost:6379/0`) before starting the app
+        
         ### Features:
         - ✅ Real-time streaming of invalid addresses
         - ✅ Support for CSV and Excel files
@@ -446,6 +940,7 @@ def main():
         - ✅ Multiple download options
         - ✅ Geocoding data (lat/lng) included
         - ✅ Rate limiting to respect API quotas
+        - ✅ Cached results for previously validated addresses
         """)
 
 if __name__ == "__main__":